@@ -0,0 +1,149 @@
+import os
+import re
+import unicodedata
+import logging
+from typing import Iterable, Iterator, List
+from concurrent.futures import ProcessPoolExecutor
+
+# zero-width characters that show up in scraped text e.g. "\u200b" in voz posts
+ZERO_WIDTH_CHARS = ["\u200b", "\u200c", "\u200d", "\u2060", "\ufeff"]
+
+# pre-compiled regex
+horizontal_whitespace_regex = re.compile(r"[^\S\n]+")
+
+# translation table for sanitize_vn, filled lazily one character at a time
+# each character is mapped to what NFD + removing accents + replacing đ + replacing
+# non-alphanumeric and whitespace with a single space would turn it into
+class _SanitizeTable(dict):
+    def __missing__(self, codepoint):
+        chars = unicodedata.normalize("NFD", chr(codepoint))
+        chars = "".join([x for x in chars if not unicodedata.combining(x)])
+        chars = chars.replace("đ", "d")
+        chars = "".join([x if x.isalnum() or x == "_" else " " for x in chars])
+
+        self[codepoint] = chars
+        return chars
+
+# batches are joined with a character that lower(), the translation tables and
+# unicode normalization all leave alone, so the batch can be split back afterwards
+BATCH_SEPARATOR = "\x00"
+
+sanitize_table = _SanitizeTable()
+batch_sanitize_table = _SanitizeTable({ord(BATCH_SEPARATOR): BATCH_SEPARATOR})
+zero_width_table = str.maketrans({x: None for x in ZERO_WIDTH_CHARS})
+
+# remove accent and convert vietnamese alphabet to english alphabet
+# use delimiter to replace whitespace
+def sanitize_vn(text: str, delimiter="-") -> str:
+    # lower() must see the whole string (e.g. final sigma)
+    text = text.lower().translate(sanitize_table)
+    return delimiter.join(text.split())
+
+# keep accents, only clean up unicode form, zero-width characters and whitespace
+# line breaks are preserved so paragraphs stay on their own lines
+def normalize_text(text: str, form="NFC") -> str:
+    text = unicodedata.normalize(form, text.translate(zero_width_table))
+    text = horizontal_whitespace_regex.sub(" ", text)
+    return "\n".join([x.strip() for x in text.split("\n")])
+
+def chunked(items: Iterable, chunk_size: int) -> Iterator[List]:
+    chunk = []
+    for x in items:
+        chunk.append(x)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# same output as calling sanitize_vn on each text, but lower() and translate()
+# run once over the whole batch
+def sanitize_vn_batch(texts: List[str], delimiter="-") -> List[str]:
+    if not texts:
+        return []
+
+    text = BATCH_SEPARATOR.join(texts)
+    # fall back to one text at a time if the separator is part of the data
+    if text.count(BATCH_SEPARATOR) != len(texts) - 1:
+        return [sanitize_vn(x, delimiter=delimiter) for x in texts]
+
+    text = text.lower().translate(batch_sanitize_table)
+    return [delimiter.join(x.split()) for x in text.split(BATCH_SEPARATOR)]
+
+# same output as calling normalize_text on each text, but each pass runs once over the whole batch
+def normalize_text_batch(texts: List[str], form="NFC") -> List[str]:
+    if not texts:
+        return []
+
+    # the separator sits on its own line so stripping lines does not cross texts
+    separator = f"\n{BATCH_SEPARATOR}\n"
+    text = separator.join(texts)
+    if text.count(BATCH_SEPARATOR) != len(texts) - 1:
+        return [normalize_text(x, form=form) for x in texts]
+
+    return normalize_text(text, form=form).split(separator)
+
+def normalize_file(src: str, dst: str=None, form="NFC", chunk_size: int=10000) -> int:
+    # normalize in place if dst is not given or is the source file itself
+    in_place = not dst or os.path.realpath(dst) == os.path.realpath(src)
+    out_path = f"{src}.tmp" if in_place else dst
+
+    num_lines = 0
+    try:
+        with open(src, "r", encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
+            # join a chunk of lines so each chunk is normalized with a few C-level passes
+            for lines in chunked(f_in, chunk_size):
+                f_out.write(normalize_text("".join(lines), form=form))
+                num_lines += len(lines)
+    except BaseException:
+        if in_place and os.path.exists(out_path):
+            os.remove(out_path)
+        raise
+
+    if in_place:
+        os.replace(out_path, src)
+
+    return num_lines
+
+def normalize_files(paths: List[str], out_dir: str=None, form="NFC", chunk_size: int=10000, num_workers: int=None) -> List[int]:
+    if out_dir:
+        # keep the directory structure below the common parent of all inputs
+        # e.g. data/story/<author>/<title>.txt, where titles repeat across authors
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(x)) for x in paths])
+        dsts = [os.path.join(out_dir, os.path.relpath(os.path.abspath(x), root)) for x in paths]
+    else:
+        dsts = [None] * len(paths)
+
+    real_dsts = [os.path.realpath(dst if dst else src) for src, dst in zip(paths, dsts)]
+    if len(set(real_dsts)) != len(real_dsts):
+        raise ValueError("Some inputs would be written to the same output file")
+
+    for dst in dsts:
+        if dst:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(normalize_file, src, dst, form=form, chunk_size=chunk_size) for src, dst in zip(paths, dsts)]
+        num_lines = [x.result() for x in futures]
+
+    logging.info(f"Normalized {sum(num_lines)} lines from {len(paths)} files")
+    return num_lines
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Normalize text files in place or into another directory")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--out_dir", default=None)
+    parser.add_argument("--form", default="NFC", choices=["NFC", "NFKC"])
+    parser.add_argument("--chunk_size", type=int, default=10000)
+    parser.add_argument("--num_workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    normalize_files(args.paths, out_dir=args.out_dir, form=args.form, chunk_size=args.chunk_size, num_workers=args.num_workers)
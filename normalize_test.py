@@ -0,0 +1,89 @@
+import os
+import pytest
+
+from normalize import sanitize_vn, sanitize_vn_batch, normalize_text, normalize_text_batch, normalize_file, normalize_files, chunked
+
+def test_sanitize_vn():
+    inputs = [
+        "luc nao cung the",
+        "đi qua hoa cúc",
+        "ă â đ ê ô ơ ư",
+        "Đế quốc ở ngoài bờ sông",
+        "Có nên làm thế? - Tập 1: Hồi ức quá khứ;",
+        "HiHi------<Olas   "
+    ]
+
+    true_outputs = [
+        "luc_nao_cung_the",
+        "di_qua_hoa_cuc",
+        "a_a_d_e_o_o_u",
+        "de_quoc_o_ngoai_bo_song",
+        "co_nen_lam_the_tap_1_hoi_uc_qua_khu",
+        "hihi_olas"
+    ]
+
+    outputs = sanitize_vn_batch(inputs, delimiter="_")
+    assert outputs == true_outputs
+    assert sanitize_vn("Hồi ức quá khứ") == "hoi-uc-qua-khu"
+
+def test_normalize_text():
+    # decomposed "ế" is composed back, zero-width characters and extra spaces are removed
+    text = "  đe\u0302\u0301  quốc\u200b\t ở\n\ufeffngoài bờ sông \n"
+    assert normalize_text(text) == "đế quốc ở\nngoài bờ sông\n"
+    assert normalize_text("ｈｉ") == "ｈｉ"
+    assert normalize_text("ｈｉ", form="NFKC") == "hi"
+
+def test_normalize_file(tmp_path):
+    src = os.path.join(tmp_path, "book.txt")
+    with open(src, "w", encoding="utf-8") as f:
+        f.write("Chương 1\n  đế quốc\u200b \n\nhết\n")
+
+    num_lines = normalize_file(src, chunk_size=2)
+    assert num_lines == 4
+    with open(src, "r", encoding="utf-8") as f:
+        assert f.read() == "Chương 1\nđế quốc\n\nhết\n"
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+def test_normalize_text_batch():
+    texts = ["  đế ", "", "a\n b \n", "ｈｉ\u200b"]
+    assert normalize_text_batch(texts) == [normalize_text(x) for x in texts]
+    assert normalize_text_batch(texts, form="NFKC") == [normalize_text(x, form="NFKC") for x in texts]
+    # separator inside the data falls back to one text at a time
+    assert normalize_text_batch(["a\x00 ", " b"]) == ["a\x00", "b"]
+
+def test_sanitize_vn_batch_matches_single():
+    texts = ["ΣΑΣ", "Đế quốc", "", "  ", "x\x00y", "ΌΣ"]
+    assert sanitize_vn_batch(texts) == [sanitize_vn(x) for x in texts]
+    assert sanitize_vn_batch([]) == []
+
+def test_normalize_file_same_dst(tmp_path):
+    src = os.path.join(tmp_path, "book.txt")
+    with open(src, "w", encoding="utf-8") as f:
+        f.write(" hết \n")
+
+    assert normalize_file(src, src) == 1
+    with open(src, "r", encoding="utf-8") as f:
+        assert f.read() == "hết\n"
+    assert os.listdir(tmp_path) == ["book.txt"]
+
+def test_normalize_files(tmp_path):
+    # same title from two authors
+    paths = []
+    for author, text in [("a", " one \n"), ("b", "two\u200b\n")]:
+        author_dir = os.path.join(tmp_path, "data", author)
+        os.makedirs(author_dir)
+        paths.append(os.path.join(author_dir, "title.txt"))
+        with open(paths[-1], "w", encoding="utf-8") as f:
+            f.write(text)
+
+    out_dir = os.path.join(tmp_path, "out")
+    assert normalize_files(paths, out_dir=out_dir, num_workers=2) == [1, 1]
+    with open(os.path.join(out_dir, "a", "title.txt"), "r", encoding="utf-8") as f:
+        assert f.read() == "one\n"
+    with open(os.path.join(out_dir, "b", "title.txt"), "r", encoding="utf-8") as f:
+        assert f.read() == "two\n"
+
+    with pytest.raises(ValueError):
+        normalize_files([paths[0], paths[0]], out_dir=out_dir)
@@ -1,8 +1,6 @@
 import os
-import re
 import asyncio, aiohttp
 from bs4 import BeautifulSoup
-import unicodedata
 import logging
 from datetime import datetime
 
@@ -15,10 +13,7 @@ del current_dir
 del parent_dir
 
 from utils import Tracker
-
-# pre-compiled regex
-non_alphanumeric_regex = re.compile(r"[^\w\d\s]+")
-whitespace_regex = re.compile(r"\s+")
+from normalize import sanitize_vn
 
 # custom csv writer to support appending to existing csv file
 class CSVWriter:
@@ -40,17 +35,37 @@ class CSVWriter:
                 f.write(",".join([str(x) for x in row]))
                 f.write("\n")
 
-# remove accent and convert vietnamese alphabet to english alphabet
-# use delimiter to replace whitespace
-def sanitize_vn(text, delimiter="-"):
-    text = unicodedata.normalize("NFD", text.lower())
-    text = "".join([x for x in text if not unicodedata.combining(x)])
-    text = text.replace("đ", "d")
-    text = non_alphanumeric_regex.sub(" ", text)
-    text = whitespace_regex.sub(" ", text)
-    text = text.strip().replace(" ", delimiter)
-
-    return text
+# book tracker for one author
+# also keeps path and number of chapters of saved books so that index.csv rows
+# of an author can be written even if its books were saved in an earlier run
+class BookTracker(Tracker):
+    def __init__(self, name, path="./"):
+        super().__init__(name, path=path)
+        self.books = {}
+        self.books_csv = CSVWriter(f"{name}_books", ["title", "path", "num_chapters"], path=path)
+
+        with open(self.books_csv.full_path, "r", encoding="utf-8") as f:
+            next(f)
+            for line in f:
+                # title is not sanitized for csv, but path and num_chapters never contain ","
+                title, book_path, num_chapters = line.rstrip("\n").rsplit(",", 2)
+                self.books[title] = (book_path, int(num_chapters))
+
+    def add_book(self, title, book_path, num_chapters):
+        self.books[title] = (book_path, num_chapters)
+        self.books_csv.write_rows([(title, book_path, num_chapters)])
+        self.add(title)
+
+    # a book is only done if its path and number of chapters are known
+    def check(self, title):
+        return title in self.books
+
+    # (titles, paths, num_chapters) of saved books, in the order of titles
+    def get_saved_books(self, titles):
+        titles = [x for x in titles if self.check(x)]
+        paths = [self.books[x][0] for x in titles]
+        num_chapters = [self.books[x][1] for x in titles]
+        return titles, paths, num_chapters
 
 # client to handle network requests
 # wrap around aiohttp session
@@ -78,7 +93,7 @@ def extract_books_from_soup(soup):
 
     return urls, titles
 
-async def get_books(author, base_url="https://isach.info/", client=None, book_type="story"):
+async def get_books(author, base_url="https://isach.info/", client=None, book_type="story", semaphore: asyncio.Semaphore=None):
     need_close = False
     if not client:
         client = AsyncClient()
@@ -89,7 +104,17 @@ async def get_books(author, base_url="https://isach.info/", client=None, book_ty
         "list": book_type,
         "author": author
     }
-    soup = await client.get_soup_from_url(full_url, params=params)
+    # limit the number of pages requested at the same time
+    if not semaphore:
+        semaphore = asyncio.Semaphore(10)
+
+    async def get_page(page):
+        async with semaphore:
+            soup = await client.get_soup_from_url(full_url, params={**params, "page": page})
+        return extract_books_from_soup(soup)
+
+    async with semaphore:
+        soup = await client.get_soup_from_url(full_url, params=params)
 
     nav_pages = soup.find("ul", class_="pagination").find_all("li")
     if len(nav_pages) == 1:
@@ -101,12 +126,18 @@ async def get_books(author, base_url="https://isach.info/", client=None, book_ty
     # first page
     urls, titles = extract_books_from_soup(soup)
 
-    # rest of the pages
-    for i in range(2, num_pages+1):
-        params["page"] = i
-        soup = await client.get_soup_from_url(full_url, params=params)
-        new_urls, new_titles = extract_books_from_soup(soup)
-
+    # rest of the pages, fetched concurrently. gather keeps the page order
+    tasks = [asyncio.create_task(get_page(i)) for i in range(2, num_pages+1)]
+    try:
+        pages = await asyncio.gather(*tasks)
+    except BaseException:
+        # do not leave the other pages running if one of them fails
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    for new_urls, new_titles in pages:
         urls.extend(new_urls)
         titles.extend(new_titles)
     
@@ -153,7 +184,7 @@ def extract_text(soup):
 
     return paras
 
-async def write_book_to_file(url, title, base_dir, client=None, book_type="story", tracker: Tracker=None):
+async def write_book_to_file(url, title, base_dir, client=None, book_type="story"):
     need_close = False
     if not client:
         client = AsyncClient()
@@ -170,59 +201,143 @@ async def write_book_to_file(url, title, base_dir, client=None, book_type="story
             for x in paras:
                 f.write(x)
                 f.write("\n")
-    
-    # record books that have been saved
-    if tracker:
-        tracker.add(title)
-        tracker.save()
 
     if need_close:
         await client.close()
     
     return path, num_chapters
 
-async def write_author_to_file(author, client=None, data_dir="./data", book_type="story"):
-    logging.info(f"Collecting books from {author}")
+# write a book and record it in the book tracker of its author
+async def write_and_track_book(url, title, base_dir, tracker: BookTracker, client=None, book_type="story"):
+    path, num_chapters = await write_book_to_file(url, title, base_dir, client=client, book_type=book_type)
+    tracker.add_book(title, path, num_chapters)
+    tracker.save()
 
-    need_close = False
-    if not client:
-        client = AsyncClient()
-        need_close = True
+    return path, num_chapters
+
+async def get_author_books(author, client, data_dir="./data", book_type="story", semaphore: asyncio.Semaphore=None):
+    logging.info(f"Collecting books from {author}")
 
     # book tracker for each author
-    tracker = Tracker(f"{book_type}_{author}_books_tracker", path="trackers")
+    tracker = BookTracker(f"{book_type}_{author}_books_tracker", path="trackers")
 
     folder_name = sanitize_vn(author)
     author_dir = os.path.join(data_dir, book_type, folder_name)
     os.makedirs(author_dir, exist_ok=True)
 
-    urls, titles = await get_books(sanitize_vn(author, delimiter="_"), client=client, book_type=book_type)
+    urls, titles = await get_books(sanitize_vn(author, delimiter="_"), client=client, book_type=book_type, semaphore=semaphore)
+
+    logging.info(f"{len(urls)} books found for {author}")
+    return tracker, author_dir, urls, titles
+
+async def write_author_to_file(author, client=None, data_dir="./data", book_type="story"):
+    need_close = False
+    if not client:
+        client = AsyncClient()
+        need_close = True
 
-    logging.info(f"{len(urls)} books found. Writing them to files")
+    tracker, author_dir, urls, titles = await get_author_books(author, client, data_dir=data_dir, book_type=book_type)
     
     tasks = []
     num_concurrent = 50
     # parallelize only at book level
     for url, title in zip(urls, titles):
-        if tracker and tracker.check(f"{book_type}_{author}_{title}"):
+        if tracker.check(title):
             continue
 
-        task = asyncio.create_task(write_book_to_file(url, title, author_dir, client=client, book_type=book_type, tracker=tracker))
+        task = asyncio.create_task(write_and_track_book(url, title, author_dir, tracker, client=client, book_type=book_type))
         if len(tasks) > num_concurrent:
             await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
         
         tasks.append(task)
     
-    books = await asyncio.gather(*tasks)
-    paths = [x[0] for x in books]
-    num_chapters = [x[1] for x in books]
+    await asyncio.gather(*tasks)
 
     if need_close:
         await client.close()
     
-    return titles, paths, num_chapters
+    # include books saved in earlier runs
+    return tracker.get_saved_books(titles)
+
+# schedule books from all authors on one pool of workers
+# an author is added to author_tracker and index_csv once all of its books are written
+async def write_authors_to_file(authors, index_csv, author_tracker: Tracker, client=None, data_dir="./data", num_concurrent=50, num_listing=10):
+    need_close = False
+    if not client:
+        client = AsyncClient()
+        need_close = True
+
+    queue = asyncio.Queue()
+    # shared by all authors, so listing never takes more than num_listing connections from the workers
+    page_semaphore = asyncio.Semaphore(num_listing)
+
+    def finish_author(author, book_type, job):
+        id = f"{book_type}_{author}"
+        if job["failed"]:
+            logging.error(f"{job['failed']} book(s) of {id} failed. Author will be retried on the next run")
+            return
+
+        titles, paths, num_chapters = job["tracker"].get_saved_books(job["titles"])
+        num_books = len(titles)
+        rows = zip([author]*num_books, [book_type]*num_books, titles, paths, num_chapters)
+        index_csv.write_rows(rows)
+        author_tracker.add(id)
+        author_tracker.save()
+        logging.info(f"Finished {id} with {num_books} books")
+
+    async def list_author(author, book_type):
+        try:
+            tracker, author_dir, urls, titles = await get_author_books(author, client, data_dir=data_dir, book_type=book_type, semaphore=page_semaphore)
+        except Exception as e:
+            logging.error(e)
+            logging.error(f"Unable to get books of {book_type}_{author}. Skipping this author")
+            return
+
+        books = [(url, title) for url, title in zip(urls, titles) if not tracker.check(title)]
+        job = {"remaining": len(books), "failed": 0, "tracker": tracker, "titles": titles}
+        if not books:
+            finish_author(author, book_type, job)
+            return
+
+        for url, title in books:
+            queue.put_nowait((author, book_type, url, title, author_dir, job))
+
+    async def worker():
+        while True:
+            author, book_type, url, title, author_dir, job = await queue.get()
+            try:
+                await write_and_track_book(url, title, author_dir, job["tracker"], client=client, book_type=book_type)
+            except Exception as e:
+                logging.error(e)
+                logging.error(f"Failed to write {url}")
+                job["failed"] += 1
+            finally:
+                job["remaining"] -= 1
+                if job["remaining"] == 0:
+                    finish_author(author, book_type, job)
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(num_concurrent)]
+
+    listings = []
+    for book_type, book_type_authors in authors.items():
+        for auth in book_type_authors:
+            if author_tracker.check(f"{book_type}_{auth}"):
+                continue
+            listings.append(list_author(auth, book_type))
+
+    # all books are in the queue once every author is listed
+    await asyncio.gather(*listings)
+    await queue.join()
+
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
 
-async def main():
+    if need_close:
+        await client.close()
+
+async def main(work_queue=True):
     client = AsyncClient()
     tracker = Tracker("author_tracker", path="trackers")
 
@@ -235,6 +350,11 @@ async def main():
 
     columns=["author", "book_type", "title", "path", "num_chapters"]
     index_csv = CSVWriter("index", columns)
+
+    if work_queue:
+        await write_authors_to_file(authors, index_csv, tracker, client=client)
+        await client.close()
+        return
     
     for book_type, book_type_authors in authors.items():
         for auth in book_type_authors:
@@ -1,10 +1,19 @@
+import asyncio
 import bs4
 
-from isach import get_soup_from_url, sanitize_vn
+import isach
+from isach import AsyncClient, CSVWriter, sanitize_vn
+from utils import Tracker
 
 def test_get_soup_from_url():
+    async def get_soup(url):
+        client = AsyncClient()
+        soup = await client.get_soup_from_url(url)
+        await client.close()
+        return soup
+
     url = "https://example.com/"
-    soup = get_soup_from_url(url)
+    soup = asyncio.run(get_soup(url))
     assert type(soup) == bs4.BeautifulSoup
 
     title = soup.find("h1")
@@ -29,7 +38,77 @@ def test_sanitize_vn():
         "hihi_olas"
     ]
 
-    outputs = [sanitize_vn(s) for s in inputs]
+    outputs = [sanitize_vn(s, delimiter="_") for s in inputs]
 
     for x,y in zip(true_outputs, outputs):
         assert x == y
+
+def test_write_authors_to_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    # books of each author, keyed by the author name used in the url
+    books = {
+        "tac_gia_a": ["A1", "A2", "A3"],
+        "b": [],
+        "c": ["C1", "C2"],
+    }
+    failing = {"url_C2"}
+    written = []
+    active = {"now": 0, "max": 0}
+
+    async def fake_get_books(author, client=None, book_type="story", semaphore=None):
+        titles = books[author]
+        return [f"url_{x}" for x in titles], titles
+
+    async def fake_write_book_to_file(url, title, base_dir, client=None, book_type="story"):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+
+        if url in failing:
+            raise ValueError(f"Unable to get {url}")
+        written.append(title)
+        return f"{base_dir}/{title}.txt", len(title)
+
+    monkeypatch.setattr(isach, "get_books", fake_get_books)
+    monkeypatch.setattr(isach, "write_book_to_file", fake_write_book_to_file)
+
+    authors = {"story": ["Tác giả A", "B"], "poem": ["C"]}
+    columns = ["author", "book_type", "title", "path", "num_chapters"]
+
+    def run():
+        index_csv = CSVWriter("index", columns)
+        author_tracker = Tracker("author_tracker", path="trackers")
+        asyncio.run(isach.write_authors_to_file(authors, index_csv, author_tracker, client=object(), num_concurrent=4))
+
+        author_tracker = Tracker("author_tracker", path="trackers")
+        with open("index.csv", "r", encoding="utf-8") as f:
+            rows = [line.rstrip().split(",") for line in f][1:]
+        return author_tracker, rows
+
+    author_tracker, rows = run()
+    # more books in flight than any single author has
+    assert active["max"] == 4
+    assert sorted(written) == ["A1", "A2", "A3", "C1"]
+    assert author_tracker.check("story_Tác giả A")
+    assert author_tracker.check("story_B")
+    assert not author_tracker.check("poem_C")
+    assert [x[2] for x in rows] == ["A1", "A2", "A3"]
+
+    # resume: only the failed book is written again, C gets rows for both books
+    failing.clear()
+    written.clear()
+    author_tracker, rows = run()
+    assert written == ["C2"]
+    assert author_tracker.check("poem_C")
+    assert rows[3:] == [
+        ["C", "poem", "C1", "./data/poem/c/C1.txt", "2"],
+        ["C", "poem", "C2", "./data/poem/c/C2.txt", "2"],
+    ]
+
+    # nothing left to do
+    written.clear()
+    _, rows_again = run()
+    assert written == []
+    assert rows_again == rows